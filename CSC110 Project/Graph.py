@@ -4,11 +4,15 @@
 #
 
 import data
+import assets
+import memory
+from compositor import RenderWorker
 
 from tkinter import *
 from PIL import Image, ImageDraw, ImageTk, ImageFont
 import numpy as np
-from typing import List, Tuple
+from typing import Optional, Tuple
+from functools import partial
 import time
 
 
@@ -22,11 +26,74 @@ def reScale(old: float, old_min: float, old_max: float,
 f = ('Times', 15, 'bold')
 g = ('Times', 22)
 
+# Corners of the plot area, drawn as the axes
+AXES_X = np.array([0, 0, 1, 1])
+AXES_Y = np.array([1, 0, 0, 1])
+
+
+def formatDelta(values: np.ndarray, i: int) -> str:
+    """Change of values[i] from the previous value, as text"""
+    if i == 0:
+        return 'n/a'
+    return '{:+,}'.format(int(values[i] - values[i-1]))
+
+
+class HoverTable:
+    """Everything the hover readout shows, precomputed for one dataset
+    and plot area so that hovering is a single array index
+
+        - column: year index under each pixel column of the canvas,
+          or -1 outside the plot area
+        - x: screen x of each year
+        - donationY, emissionY: screen y of each point of the two lines
+        - yearText, donationText, emissionText: the readout of each year
+    """
+    __slots__ = ('column', 'x', 'donationY', 'emissionY',
+                 'yearText', 'donationText', 'emissionText')
+
+    def __init__(self, dat: data.Dataset, width: int,
+                 bounds: Tuple[int,int,int,int]) -> None:
+        """Build the table for dat plotted within bounds (x, y, width, height)
+            on a canvas width pixels wide
+        """
+        years = dat.get_year()
+        donations = dat.get_donation()
+        emissions = dat.get_emission()
+        left, top, w, h = bounds
+
+        # Same scaling as Grapher.graph
+        self.x = reScale(years, years[0], years[-1], left, left + w)
+        self.donationY = reScale(donations, donations.max(), donations.min(),
+                                 top, top + h)
+        self.emissionY = reScale(emissions, emissions.max(), emissions.min(),
+                                 top, top + h)
+
+        # Snap every column of the plot area to the nearest year
+        columns = np.arange(width)
+        nearest = np.searchsorted(self.x, columns)
+        nearest = np.clip(nearest, 1, len(years) - 1)
+        closer_left = columns - self.x[nearest-1] < self.x[nearest] - columns
+        self.column = np.where(closer_left, nearest - 1, nearest)
+        self.column[(columns <= left) | (columns >= left + w)] = -1
+
+        self.yearText = [str(year) for year in years]
+        self.donationText = ['Donations: {:,} {} ({})'.format(
+                                 int(donations[i]), dat.currency,
+                                 formatDelta(donations, i))
+                             for i in range(len(years))]
+        self.emissionText = ['Emissions: {:,} MT ({})'.format(
+                                 int(emissions[i]), formatDelta(emissions, i))
+                             for i in range(len(years))]
+
 class Grapher(Frame):
     """Tkinter window that provides basic line graphing"""
     
-    def __init__(self, root=None) -> None:
-        """Initialize window and properties"""
+    def __init__(self, root=None, memory_budget: Optional[int] = None) -> None:
+        """Initialize window and properties
+
+            memory_budget caps the bytes used to composite a frame,
+            by using less precise frame buffers (see memory.py)
+        """
         
         # This class can be run by itself or be subclassed
         if root is None:
@@ -41,13 +108,24 @@ class Grapher(Frame):
         self.root = root
 
         self.BUTTON_SIZE = (self.W*3//8, self.W//7)
-        button = Image.open("Button2.png").convert("RGBA")
-        button = button.resize(self.BUTTON_SIZE)
-        self._button = np.array(button, "float") * 1
 
-        # Copy so we can change opacity value
-        self.buttons = [np.array(self._button),
-                        np.array(self._button)]
+        # Precision of the frame buffers and the assets blended onto them
+        self.dtype = memory.choose_dtype((self.H, self.W, 4),
+                                         self.residentValues(),
+                                         self.largestBlended(), memory_budget)
+
+        self._button = assets.load_asset("Button2.png", self.BUTTON_SIZE,
+                                         dtype=self.dtype)
+
+        # Each button is either lit or dimmed, so both are made only once
+        self._buttonLit = 1.5 * self._button
+        self._buttonDim = 0.9 * self._button
+        self.buttons = [self._buttonDim, self._buttonDim]
+
+        # The graph lines are drawn straight into this buffer by the
+        # render worker, instead of into a new image every frame
+        self._lineCanvas = np.zeros((self.H, self.W, 4), dtype='uint8')
+        self._lineCanvasShared = self.lineCanvasShared()
 
         self.canvasItems = []
 
@@ -56,8 +134,27 @@ class Grapher(Frame):
 
         self.window = 'Graph'
 
+        # Hover lookup tables, keyed by (country, W, H)
+        self.hoverTables = {}
+
+        # Composites frames off the Tk thread (see compositor.py)
+        self.worker = RenderWorker((self.H, self.W, 4), self.dtype)
+
+
+    def largestBlended(self) -> int:
+        """Number of values in the largest image blended onto a frame"""
+        return self.BUTTON_SIZE[0] * self.BUTTON_SIZE[1] * 4
+
+
+    def residentValues(self) -> int:
+        """Number of values in the asset arrays kept in self.dtype"""
+        # The button and its lit and dimmed copies
+        return 3 * self.BUTTON_SIZE[0] * self.BUTTON_SIZE[1] * 4
+
 
     def start(self):
+        self.worker.start()
+
         self.setupData()
         
         self.makeWidgets()
@@ -71,9 +168,12 @@ class Grapher(Frame):
         
         print("Importing data...")
         t = time.perf_counter()
-        self.datU = data.UsaData().data
-        self.datC = data.CanadaData().data
+        self.datU = data.load_dataset('U')
+        self.datC = data.load_dataset('C')
         print("Done in", time.perf_counter() - t)
+
+        # The hover tables were built from the previous datasets
+        self.hoverTables = {}
         
 
     def makeWidgets(self) -> None:
@@ -98,47 +198,28 @@ class Grapher(Frame):
     def graphData(self) -> None:
         """Draw a double line graph and axis labels"""
         self.clearCanvas()
-        
-        self.img = Image.new("RGBA", (self.W, self.H))
-
-        bounds = (self.W//6, 10, self.W*2//3, self.H*3//5)
 
         if self.country == 'C':
             dat = self.datC
         else:
             dat = self.datU
 
-        year_min = min(dat)
-        year_max = max(dat)
-        self.year_min = year_min
-        self.year_max = year_max
-        
-        # Donation
-        coords = [(year, dat[year]['Donation']) for year in dat]
-        don_min = min(c[1] for c in coords)
-        don_max = max(c[1] for c in coords)
-
-        # Sort by year
-        coords = sorted(coords)
-        self.graph(coords, bounds, (192,128,0,255))
-
-        # Emission
-        coords = [(year, dat[year]['Emission']) for year in dat]
-        emi_min = min(c[1] for c in coords)
-        emi_max = max(c[1] for c in coords)
-
-        # Sort by year
-        coords = sorted(coords)
-        self.graph(coords, bounds, (0,160,192,255))
+        # The lines and buttons are composited on the render worker
+        self.worker.submit(partial(self.composeGraph, dat=dat))
 
+        # Columns are already sorted by year
+        years = dat.get_year()
+        year_min = int(years[0])
+        year_max = int(years[-1])
 
-        # Make axes
-        axes = [(0,1),(0,0),(1,0),(1,1)]
-        self.graph(axes, bounds, (255,255,255,255))
+        don_min = int(dat.get_donation().min())
+        don_max = int(dat.get_donation().max())
+        emi_min = int(dat.get_emission().min())
+        emi_max = int(dat.get_emission().max())
 
         # Make axis labels on Tk canvas
         # (too troublesome to wrangle PIL fonts across platforms)
-        currency = 'CAD' if self.country == 'C' else 'USD'
+        currency = dat.currency
         yd = self.d.create_text(self.W//6 - 10, 180, anchor='e',
                                 text='Donations\n({})'.format(currency),
                                 fill='#c80', font=f)
@@ -166,13 +247,6 @@ class Grapher(Frame):
 
         self.canvasItems = [yd, ye, ld, hd, le, he, year, y_low, y_high]
 
-        frame = np.array(self.img, dtype='int')
-        self.blend(frame, self.buttons[0], (self.W//4, self.H-80), 'screen')
-        self.blend(frame, self.buttons[1], (self.W*3//4, self.H-80), 'screen')
-        frame[:,:,3] = 255
-        frame = np.clip(frame, 0, 255)
-        self.img1 = Image.fromarray(frame.astype('uint8'))
-        
         button1 = self.d.create_text(self.W//4, self.H-80,
                                      text='Switch countries', fill='#fff', font=g)
         
@@ -181,19 +255,84 @@ class Grapher(Frame):
     
         self.canvasItems.extend([button1, button2])
 
-        # Update canvas image
-        self.cf = ImageTk.PhotoImage(self.img1)
+        # Update canvas image with the last finished frame
+        self.presentFrame()
+
+
+    def lineCanvasImage(self) -> Image.Image:
+        """Wrap the cleared line canvas in an image, without copying it"""
+        self._lineCanvas[...] = 0
+        img = Image.frombuffer("RGBA", (self.W, self.H), self._lineCanvas,
+                               "raw", "RGBA", 0, 1)
+        # Images made by frombuffer are read-only, and PIL would copy the
+        # buffer before drawing on one
+        img.readonly = 0
+        return img
+
+
+    def lineCanvasShared(self) -> bool:
+        """Whether this version of PIL draws into the line canvas itself
+            instead of into a copy of it
+        """
+        img = self.lineCanvasImage()
+        ImageDraw.Draw(img).point((0, 0), fill=(255, 255, 255, 255))
+        shared = self._lineCanvas[0, 0, 3] == 255
+        self._lineCanvas[...] = 0
+        return bool(shared)
+
+
+    def composeGraph(self, frame: np.ndarray, dat: data.Dataset) -> None:
+        """Composite the double line graph of dat and the buttons into frame
+            Runs on the render worker thread
+        """
+        tracker = self.worker.tracker
+
+        with tracker.stage('lines'):
+            img = self.lineCanvasImage()
+
+            bounds = (self.W//6, 10, self.W*2//3, self.H*3//5)
+
+            years = dat.get_year()
+            self.graph(img, years, dat.get_donation(), bounds, (192,128,0,255))
+            self.graph(img, years, dat.get_emission(), bounds, (0,160,192,255))
+
+            # Make axes
+            self.graph(img, AXES_X, AXES_Y, bounds, (255,255,255,255))
+
+            if not self._lineCanvasShared:
+                # PIL drew into a copy of the canvas, so copy it back
+                self._lineCanvas[...] = np.asarray(img)
+            frame[...] = self._lineCanvas
+
+        with tracker.stage('buttons'):
+            self.blend(frame, self.buttons[0], (self.W//4, self.H-80), 'screen')
+            self.blend(frame, self.buttons[1], (self.W*3//4, self.H-80), 'screen')
+            frame[:,:,3] = 255
+
+
+    def presentFrame(self) -> bool:
+        """Show the newest frame finished by the render worker, if any"""
+        return self.worker.present(self.showFrame)
+
+
+    def showFrame(self, image: Image.Image) -> None:
+        """Swap image onto the canvas"""
+        self.cf = ImageTk.PhotoImage(image)
         self.d.itemconfigure(self.finalRender, image=self.cf)
 
 
-    def graph(self, coords: List[Tuple[int,int]], bounds: Tuple[int,int,int,int],
+    def graph(self, img: Image.Image, xs: np.ndarray, ys: np.ndarray,
+              bounds: Tuple[int,int,int,int],
               color: Tuple[int,int,int,int]) -> None:
-        """Draw a line joining coords together within bounds
+        """Draw a line on img joining the points (xs[i], ys[i]) together
+            within bounds
             Bounds is (x, y, width, height)
         """
         
         # Scale data to fit in (0,1)
-        xy = np.array(coords, dtype="float")
+        xy = np.empty((len(xs), 2), dtype="float")
+        xy[:,0] = xs
+        xy[:,1] = ys
         xy[:,1] *= -1
         x_max = np.max(xy[:,0])
         x_min = np.min(xy[:,0])
@@ -210,7 +349,7 @@ class Grapher(Frame):
         xy[:,1] += bounds[1]
 
         # Draw data
-        d = ImageDraw.Draw(self.img)
+        d = ImageDraw.Draw(img)
         d.line(xy.flatten().tolist(), fill=color, width=4)
 
 
@@ -221,37 +360,69 @@ class Grapher(Frame):
         x = self.d.winfo_pointerx() - self.d.winfo_rootx()
         y = self.d.winfo_pointery() - self.d.winfo_rooty()
 
-        # Make lines if mouse is hovering
+        # Make lines and readout if mouse is hovering
         if self.selected(x, y, (self.W//6, 10, self.W*5//6, self.H*3//5)):
-            selected_year = reScale(x, self.W//6, self.W*5//6,
-                                    self.year_min, self.year_max)
-            selected_year = round(selected_year)
-            new_xcoord = reScale(selected_year, self.year_min, self.year_max,
-                                 self.W//6, self.W*5//6)
-            
-            vrule = self.d.create_line(new_xcoord, 10, new_xcoord, self.H*3//5,
-                                       fill='#c0a', width=2)
-            self.d.tag_raise(vrule)
-            self.canvasItems.append(vrule)
-            sel_year = self.d.create_text(self.W//2, self.H*3//5 + 40,
-                                          anchor='n', text=str(selected_year),
-                                          fill='#c0a', font=f)
-            self.d.tag_raise(sel_year)
-            self.canvasItems.append(sel_year)
+            table = self.hoverTable()
+            i = table.column[x]
+            if i >= 0:
+                self.drawHover(table, i)
         
         if self.selected(x, y, (100, 480, 380, 550)):
-            self.buttons[0] = 1.5 * self._button
+            self.buttons[0] = self._buttonLit
         else:
-            self.buttons[0] = 0.9 * self._button
+            self.buttons[0] = self._buttonDim
         if self.selected(x, y, (580, 480, 860, 550)):
-            self.buttons[1] = 1.5 * self._button
+            self.buttons[1] = self._buttonLit
         else:
-            self.buttons[1] = 0.9 * self._button
+            self.buttons[1] = self._buttonDim
 
         if self.window == 'Graph':
             self.after(12, self.updateCanvasGraph)
     
         
+    def hoverTable(self) -> HoverTable:
+        """The hover lookup table of the country shown, built on first use"""
+        key = (self.country, self.W, self.H)
+        if key not in self.hoverTables:
+            dat = self.datC if self.country == 'C' else self.datU
+            bounds = (self.W//6, 10, self.W*2//3, self.H*3//5)
+            self.hoverTables[key] = HoverTable(dat, self.W, bounds)
+        return self.hoverTables[key]
+
+
+    def drawHover(self, table: HoverTable, i: int) -> None:
+        """Draw the vertical rule, points and values of year index i"""
+        x = table.x[i]
+        vrule = self.d.create_line(x, 10, x, self.H*3//5,
+                                   fill='#c0a', width=2)
+
+        points = []
+        for y, color in ((table.donationY[i], '#c80'),
+                         (table.emissionY[i], '#0ac')):
+            points.append(self.d.create_oval(x - 5, y - 5, x + 5, y + 5,
+                                             fill=color, outline='#fff'))
+
+        # Keep the readout on the side of the rule with more room
+        if x < self.W//2:
+            anchor, text_x = 'nw', x + 10
+        else:
+            anchor, text_x = 'ne', x - 10
+
+        sel_year = self.d.create_text(self.W//2, self.H*3//5 + 40,
+                                      anchor='n', text=table.yearText[i],
+                                      fill='#c0a', font=f)
+        donation = self.d.create_text(text_x, 20, anchor=anchor,
+                                      text=table.donationText[i],
+                                      fill='#c80', font=f)
+        emission = self.d.create_text(text_x, 45, anchor=anchor,
+                                      text=table.emissionText[i],
+                                      fill='#0ac', font=f)
+
+        for item in [vrule] + points + [sel_year, donation, emission]:
+            self.d.tag_raise(item)
+            self.canvasItems.append(item)
+
+
     def clicked(self, evt) -> None:
         """Handles mouse click events"""
         if self.selected(evt.x, evt.y, (100, 480, 380, 550)):
@@ -274,23 +445,35 @@ class Grapher(Frame):
             centered at coords (x, y)
 
             - method in {"alpha", "add", "screen"}
+            - dest is a float array
+
+            Works in place on dest, making at most one temporary
+            of the size of source
         """
         left = coords[0] - (source.shape[1]//2)
         right = left + source.shape[1]
         up = coords[1] - (source.shape[0]//2)
         down = up + source.shape[0]
 
+        region = dest[up:down, left:right]
+
         if method == "alpha":
-            alpha = np.expand_dims(source[:,:,3], -1) / 255
-            dest[up:down, left:right] = dest[up:down, left:right] * (1-alpha) \
-                                        + source * alpha
+            # dest * (1-alpha) + source * alpha
+            alpha = source[:,:,3:] / 255
+            temp = source - region
+            temp *= alpha
+            region += temp
         
         if method == "add":
-            dest[up:down, left:right] = dest[up:down, left:right] + source
+            region += source
         
         if method == "screen":
-            dest[up:down, left:right] = 255 - (255 - dest[up:down, left:right]) \
-                                        * (255 - source) / 255
+            # 255 - (255 - dest) * (255 - source) / 255
+            temp = 255 - source
+            np.subtract(255, region, out=region)
+            region *= temp
+            region /= 255
+            np.subtract(255, region, out=region)
 
 
 if __name__ == "__main__":
@@ -3,10 +3,12 @@
 Plotting line graphs for correlation between donations
 from fossil fuel companies to politicians and GHG emissions.
 This was used for analysis alongside the graphing in Graph.py
+
+plotly is only imported once a plot is drawn, since importing it
+takes longer than starting the rest of the program.
 """
 
 import data
-import plotly.graph_objects as go
 from typing import Tuple
 
 
@@ -42,6 +44,8 @@ def plot(years: list, list_x: list, list_y: list, a: float, b: float, country: s
     """
     Plot the given x- and y-coordinates and linear regression model using plotly.
     """
+    import plotly.graph_objects as go
+
     fig = go.Figure(data=go.Scatter(x=list_x, y=list_y, mode='markers',
                                     name='Year', text=years))
  
@@ -60,8 +64,8 @@ def showPlots() -> None:
     """Show scatter plots for the datasets"""
     
     print('Importing data...')
-    usa_data = data.UsaData()
-    canada_data = data.CanadaData()
+    usa_data = data.load_dataset('U')
+    canada_data = data.load_dataset('C')
     print('Done')
     
     # get data from USA
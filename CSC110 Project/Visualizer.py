@@ -3,20 +3,24 @@
 from tkinter import *
 from PIL import Image, ImageTk, ImageDraw
 import numpy as np
+from typing import Optional
 import time
 
 from Graph import Grapher
-import Plot
+import assets
 
 f = ('Times', 32, 'bold')
 
 class Project(Grapher):
     """Tkinter window for the menu and graph"""
+
+    TITLE_SIZE = (500, 200)
+    NAMES_SIZE = (400, 36)
     
-    def __init__(self, root=None) -> None:
+    def __init__(self, root=None, memory_budget: Optional[int] = None) -> None:
         if root is None:
             root = Tk()
-        super().__init__(root)
+        super().__init__(root, memory_budget)
 
         self.root = root
         self.root.title('CSC Project')
@@ -40,35 +44,55 @@ class Project(Grapher):
 
         self.BUTTON_SIZE = (self.W*3//8, self.W//7) # W, H
 
-        # Open image assets
-        bg = Image.open("Background.jpg")
-        bg = bg.convert("RGBA").resize((self.W,self.H))
-        self.background = np.array(bg, "float")
+        # Open image assets (pre-baked and shared with Grapher, see assets.py)
+        self.background = assets.load_asset("Background.jpg", (self.W, self.H),
+                                            dtype=self.dtype)
+        self.title = assets.load_asset("Title.png", self.TITLE_SIZE,
+                                       dtype=self.dtype)
+        self.names = assets.load_asset("Names.png", self.NAMES_SIZE,
+                                       dtype=self.dtype)
+        self.button = assets.load_asset("Button2.png", self.BUTTON_SIZE,
+                                        dtype=self.dtype)
+        
+        # Each button is either lit or not, so both are made only once
+        self.buttonLit = 1.6 * self.button
+        self.buttonDim = 1.0 * self.button
+        self.buttons = [self.buttonDim, self.buttonDim,
+                        self.buttonDim, self.buttonDim]
 
-        title = Image.open("Title.png").resize((500, 200))
-        self.title = np.array(title, "float")
 
-        names = Image.open("Names.png").convert("RGBA").resize((400, 36))
-        self.names = np.array(names, "float")
-        
-        button = Image.open("Button2.png").convert("RGBA").resize((500, 200))
-        button = button.resize(self.BUTTON_SIZE)
-        self.button = np.array(button, "float") * 1
-        
-        # Copy so we can change the intensity of each button individually
-        self.buttons = [np.array(self.button),
-                        np.array(self.button),
-                        np.array(self.button),
-                        np.array(self.button)]
+    def largestBlended(self) -> int:
+        """Number of values in the largest image blended onto a frame"""
+        return max(super().largestBlended(),
+                   self.TITLE_SIZE[0] * self.TITLE_SIZE[1] * 4,
+                   self.NAMES_SIZE[0] * self.NAMES_SIZE[1] * 4)
+
+
+    def residentValues(self) -> int:
+        """Number of values in the asset arrays kept in self.dtype"""
+        # Background, title, names and the menu's lit and dimmed buttons
+        return super().residentValues() \
+            + self.W * self.H * 4 \
+            + self.TITLE_SIZE[0] * self.TITLE_SIZE[1] * 4 \
+            + self.NAMES_SIZE[0] * self.NAMES_SIZE[1] * 4 \
+            + 2 * self.BUTTON_SIZE[0] * self.BUTTON_SIZE[1] * 4
 
 
-    def start(self) -> None:
-        """Starts"""
+    def start(self) -> bool:
+        """Starts, and returns whether the first frame was shown"""
+        self.worker.start()
+
         self.makeWidgets()
 
         self.render()
 
+        # Show the first frame without waiting for the next update
+        shown = self.worker.wait(1) and self.presentFrame()
+        if shown:
+            self.totFrames += 1
+
         self.after(10, self.updateCanvas)
+        return shown
 
 
     def makeWidgets(self) -> None:
@@ -83,27 +107,11 @@ class Project(Grapher):
 
 
     def render(self) -> None:
-        self.totFrames += 1
-        
-        # Darken background
-        frame = self.background * 0.6
-        
-        # Blend in title and names
-        self.blend(frame, self.title, (self.W//2, self.H//6))
-        self.blend(frame, self.names, (self.W//2, self.H - 60), "add")
-
-        # Blend in menu buttons
-        self.blend(frame, self.buttons[0], (self.W//4, self.H-320), "screen")        
-        self.blend(frame, self.buttons[1], (self.W//4, self.H-180), "screen")
-        self.blend(frame, self.buttons[2], (self.W*3//4, self.H-320), "screen")        
-        self.blend(frame, self.buttons[3], (self.W*3//4, self.H-180), "screen")
-
-        # Convert numpy array to image
-        frame[:,:,3] = 255
-        frame = np.clip(frame, 0, 255)
-        i = Image.fromarray(frame.astype("uint8"))
-        self.cf = ImageTk.PhotoImage(i)
-        self.d.itemconfigure(self.finalRender, image=self.cf)
+        # Composite the next frame on the render worker,
+        # and show the last finished one
+        self.worker.submit(self.composeMenu)
+        if self.presentFrame():
+            self.totFrames += 1
 
         self.clearCanvas()
         # Add text to buttons
@@ -122,6 +130,33 @@ class Project(Grapher):
         self.canvasItems = [self.text0, self.text1, self.text2, self.text3]
 
 
+    def composeMenu(self, frame: np.ndarray) -> None:
+        """Composite the menu into frame
+            Runs on the render worker thread
+        """
+        tracker = self.worker.tracker
+
+        # Darken background
+        with tracker.stage('background'):
+            np.multiply(self.background, 0.6, out=frame)
+        
+        # Blend in title and names
+        with tracker.stage('title'):
+            self.blend(frame, self.title, (self.W//2, self.H//6))
+        with tracker.stage('names'):
+            self.blend(frame, self.names, (self.W//2, self.H - 60), "add")
+
+        # Blend in menu buttons
+        with tracker.stage('buttons'):
+            self.blend(frame, self.buttons[0], (self.W//4, self.H-320), "screen")
+            self.blend(frame, self.buttons[1], (self.W//4, self.H-180), "screen")
+            self.blend(frame, self.buttons[2], (self.W*3//4, self.H-320), "screen")
+            self.blend(frame, self.buttons[3], (self.W*3//4, self.H-180), "screen")
+
+            # The worker clips and converts the frame to uint8
+            frame[:,:,3] = 255
+
+
 
     def updateCanvas(self) -> None:
         x = self.d.winfo_pointerx() - self.d.winfo_rootx()
@@ -133,7 +168,7 @@ class Project(Grapher):
         self.updateButton(2, x, y, (500, 240, 780, 320))
         self.updateButton(3, x, y, (500, 380, 780, 460))
 
-        # This takes the most time
+        # Submits the next frame to the render worker
         self.render()
 
         if self.window == 'Menu':
@@ -143,9 +178,9 @@ class Project(Grapher):
     def updateButton(self, num, x, y, bounds):
         """Highlight a button if selected"""
         if self.selected(x, y, bounds):
-            self.buttons[num] = 1.6 * self.button
+            self.buttons[num] = self.buttonLit
         else:
-            self.buttons[num] = 1.0 * self.button
+            self.buttons[num] = self.buttonDim
 
 
 
@@ -165,11 +200,14 @@ class Project(Grapher):
                 
             if self.selected(evt.x, evt.y, (500, 240, 780, 320)):
                 # print("Button 2 pressed")
+                # Imported here so that plotly is not loaded on startup
+                import Plot
                 Plot.showPlots()
                 
             if self.selected(evt.x, evt.y, (500, 380, 780, 460)):
                 # print("Button 3 pressed")
                 print("Quit")
+                self.worker.stop()
                 self.root.destroy()
             
 
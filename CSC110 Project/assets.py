@@ -0,0 +1,96 @@
+"""CSC110 Fall 2020: Final Project (assets.py)
+
+Image assets pre-baked at the size and dtype the renderer uses.
+
+Decoding Background.jpg and the PNGs with PIL and resizing them took a
+noticeable part of the startup time, so each asset is converted once and
+saved as a .npy file in CACHE_FOLDER. Cached assets are memory-mapped
+read-only, and every caller asking for the same asset gets the same array.
+
+A cached file is named after the source file's contents (SHA-1), size,
+mode and dtype, so editing an image or asking for another size makes a
+new entry. To avoid hashing the sources on every start, the hash of each
+source is remembered in INDEX_FILE along with its size and modification time.
+"""
+
+from typing import Dict, Tuple
+import hashlib
+import json
+import os
+
+import numpy as np
+
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+CACHE_FOLDER = os.path.join(FOLDER, '.asset_cache')
+INDEX_FILE = os.path.join(CACHE_FOLDER, 'index.json')
+
+# Assets already loaded by this process, keyed by (filename, size, mode, dtype)
+_loaded: Dict[Tuple[str, Tuple[int, int], str, str], np.ndarray] = {}
+
+
+def _source_hash(path: str) -> str:
+    """Return the SHA-1 of the file at path, reusing the one in INDEX_FILE
+    if the file has not changed since it was computed."""
+    stat = os.stat(path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+
+    try:
+        with open(INDEX_FILE) as file:
+            index = json.load(file)
+    except (OSError, ValueError):
+        index = {}
+
+    entry = index.get(path)
+    if entry is not None and entry[:2] == signature:
+        return entry[2]
+
+    with open(path, 'rb') as file:
+        digest = hashlib.sha1(file.read()).hexdigest()
+
+    index[path] = signature + [digest]
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    temp = INDEX_FILE + '.{}.tmp'.format(os.getpid())
+    with open(temp, 'w') as file:
+        json.dump(index, file)
+    os.replace(temp, INDEX_FILE)
+
+    return digest
+
+
+def _bake(path: str, size: Tuple[int, int], mode: str, dtype: str) -> np.ndarray:
+    """Return the image at path converted to mode, resized to size
+    and as an array of dtype."""
+    from PIL import Image
+
+    image = Image.open(path).convert(mode).resize(size)
+    return np.array(image, dtype)
+
+
+def load_asset(filename: str, size: Tuple[int, int],
+               mode: str = 'RGBA', dtype: str = 'float64') -> np.ndarray:
+    """Return the image filename, converted to mode and resized to size
+    (width, height), as a read-only array of dtype.
+
+    The array has shape (height, width, channels).
+    """
+    key = (filename, tuple(size), mode, dtype)
+    if key in _loaded:
+        return _loaded[key]
+
+    path = os.path.abspath(filename)
+    cached = os.path.join(CACHE_FOLDER, '{}-{}x{}-{}-{}-{}.npy'.format(
+        os.path.splitext(os.path.basename(filename))[0],
+        size[0], size[1], mode, dtype, _source_hash(path)[:16]))
+
+    if not os.path.exists(cached):
+        array = _bake(path, size, mode, dtype)
+        os.makedirs(CACHE_FOLDER, exist_ok=True)
+        # Write to a temporary file first, so that a crash never
+        # leaves a truncated asset behind
+        temp = cached + '.{}.tmp.npy'.format(os.getpid())
+        np.save(temp, array)
+        os.replace(temp, cached)
+
+    asset = np.load(cached, mmap_mode='r')
+    _loaded[key] = asset
+    return asset
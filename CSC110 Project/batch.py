@@ -0,0 +1,230 @@
+"""CSC110 Fall 2020: Final Project (batch.py)
+
+Headless batch run of the whole analysis.
+
+Loads every country once, computes the yearly aggregates and the
+regressions used in Plot.py, and writes them as JSON or CSV together
+with the time taken by each phase. Years without emission data are left
+out of every table and listed in the summary instead. Neither tkinter nor plotly is
+imported, so this can run from cron on a machine without a display:
+
+    python batch.py --data-dir "CSC110 Project" --output results.json
+    python batch.py --format csv --output results/
+"""
+
+from typing import Dict, List, Tuple
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import data
+from Plot import simple_linear_regression
+
+
+def time_phase(timings: Dict[str, float], phase: str, start: float) -> float:
+    """Record the seconds since start as the time of phase, and
+    return the current time."""
+    now = time.perf_counter()
+    timings[phase] = now - start
+    return now
+
+
+def drop_missing_emissions(dataset: data.Dataset) -> Tuple[data.Dataset, List[int]]:
+    """Return dataset without the years that have no emission data,
+    and those years.
+
+    The emission readers return 0 for a year past the end of their
+    dataset (e.g. 2018 for Canada, whose emissions stop at 2017), so a
+    year with an emission of 0 has no emission data.
+    """
+    years = dataset.get_year()
+    donations = dataset.get_donation()
+    emissions = dataset.get_emission()
+
+    rows = {int(years[i]): (int(donations[i]), int(emissions[i]))
+            for i in range(len(dataset)) if emissions[i] != 0}
+    missing = [int(year) for year in years if int(year) not in rows]
+    return data.Dataset(dataset.country, dataset.currency, rows), missing
+
+
+def yearly_aggregates(dataset: data.Dataset) -> List[Dict[str, float]]:
+    """Return one row per year of dataset with its donation and emission,
+    their changes from the previous year and their running totals."""
+    years = dataset.get_year()
+    donations = dataset.get_donation()
+    emissions = dataset.get_emission()
+
+    donation_change = np.diff(donations, prepend=donations[:1])
+    emission_change = np.diff(emissions, prepend=emissions[:1])
+    donation_total = np.cumsum(donations)
+    emission_total = np.cumsum(emissions)
+
+    return [{'country': dataset.country,
+             'year': int(years[i]),
+             'donation': int(donations[i]),
+             'emission': int(emissions[i]),
+             'donation_change': int(donation_change[i]),
+             'emission_change': int(emission_change[i]),
+             'donation_total': int(donation_total[i]),
+             'emission_total': int(emission_total[i])}
+            for i in range(len(dataset))]
+
+
+def summary(dataset: data.Dataset, missing: List[int]) -> Dict[str, float]:
+    """Return the totals, means and extremes of dataset, where missing
+    are the years left out of dataset for lack of emission data."""
+    donations = dataset.get_donation()
+    emissions = dataset.get_emission()
+    return {'country': dataset.country,
+            'currency': dataset.currency,
+            'first_year': int(dataset.get_year()[0]),
+            'last_year': int(dataset.get_year()[-1]),
+            'years': len(dataset),
+            'years_without_emission': missing,
+            'donation_total': int(donations.sum()),
+            'donation_mean': float(donations.mean()),
+            'donation_min': int(donations.min()),
+            'donation_max': int(donations.max()),
+            'emission_total': int(emissions.sum()),
+            'emission_mean': float(emissions.mean()),
+            'emission_min': int(emissions.min()),
+            'emission_max': int(emissions.max()),
+            'correlation': correlation(donations, emissions)}
+
+
+def correlation(xs: np.ndarray, ys: np.ndarray) -> float:
+    """Return the Pearson correlation of xs and ys, or 0.0 if either is constant."""
+    if len(xs) < 2 or np.std(xs) == 0 or np.std(ys) == 0:
+        return 0.0
+    return float(np.corrcoef(xs, ys)[0, 1])
+
+
+def regressions(dataset: data.Dataset) -> List[Dict[str, float]]:
+    """Return the linear regressions y = a + bx of dataset.
+
+    'emission_on_donation_lagged' pairs each donation with the emission
+    of the year before it, as Plot.showPlots does for USA.
+    """
+    years = [int(y) for y in dataset.get_year()]
+    donations = [int(d) for d in dataset.get_donation()]
+    emissions = [int(e) for e in dataset.get_emission()]
+
+    pairs = {'emission_on_donation': (donations, emissions),
+             'emission_on_donation_lagged': (donations[1:], emissions[:-1]),
+             'donation_on_year': (years, donations),
+             'emission_on_year': (years, emissions)}
+
+    rows = []
+    for name in pairs:
+        list_x, list_y = pairs[name]
+        # A regression needs at least two distinct x values
+        if len(set(list_x)) < 2:
+            continue
+        a, b = simple_linear_regression(list_x, list_y)
+        rows.append({'country': dataset.country, 'regression': name,
+                     'a': a, 'b': b, 'points': len(list_x)})
+    return rows
+
+
+def run(countries: List[str]) -> Tuple[Dict[str, list], Dict[str, float]]:
+    """Load countries and compute every aggregate and regression.
+
+    Return the results and the time taken by each phase in seconds.
+    """
+    timings = {}
+    start = time.perf_counter()
+    t = start
+
+    datasets = []
+    missing = []
+    for country in countries:
+        dataset = data.load_dataset(country)
+        dataset, without_emission = drop_missing_emissions(dataset)
+        datasets.append(dataset)
+        missing.append(without_emission)
+        t = time_phase(timings, 'load_' + country, t)
+
+    results = {'summary': [summary(datasets[i], missing[i])
+                           for i in range(len(datasets))]}
+    t = time_phase(timings, 'summary', t)
+
+    results['yearly'] = [row for d in datasets for row in yearly_aggregates(d)]
+    t = time_phase(timings, 'yearly', t)
+
+    results['regressions'] = [row for d in datasets for row in regressions(d)]
+    time_phase(timings, 'regressions', t)
+
+    timings['total'] = time.perf_counter() - start
+    return results, timings
+
+
+def write_csv(folder: str, results: Dict[str, list],
+              timings: Dict[str, float]) -> None:
+    """Write each table of results, and the timings, as a csv file in folder."""
+    os.makedirs(folder, exist_ok=True)
+
+    tables = dict(results)
+    tables['timings'] = [{'phase': phase, 'seconds': timings[phase]}
+                         for phase in timings]
+
+    for name in tables:
+        rows = tables[name]
+        with open(os.path.join(folder, name + '.csv'), 'w', newline='') as file:
+            if rows == []:
+                continue
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def main(argv: List[str]) -> int:
+    """Run the batch from the command line arguments argv."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--format', choices=('json', 'csv'), default='json')
+    parser.add_argument('--output', default='-',
+                        help="json: file to write, or '-' for stdout; "
+                             "csv: folder to write one file per table into")
+    parser.add_argument('--data-dir', default=None,
+                        help='folder containing the csv/ and json/ datasets')
+    parser.add_argument('--countries', nargs='+', default=list(data.PROVIDERS),
+                        choices=list(data.PROVIDERS))
+    args = parser.parse_args(argv)
+
+    output = args.output
+    if output != '-':
+        output = os.path.abspath(output)
+    if args.data_dir is not None:
+        os.chdir(args.data_dir)
+
+    results, timings = run(args.countries)
+
+    if args.format == 'csv':
+        if output == '-':
+            parser.error('--format csv needs --output FOLDER')
+        write_csv(output, results, timings)
+    else:
+        document = dict(results)
+        document['timings'] = timings
+        if output == '-':
+            json.dump(document, sys.stdout, indent=2)
+            print()
+        else:
+            with open(output, 'w') as file:
+                json.dump(document, file, indent=2)
+
+    # Running headless depends on never loading the GUI or plotting modules
+    for module in ('tkinter', 'plotly'):
+        if module in sys.modules:
+            print('warning: {} was imported'.format(module), file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
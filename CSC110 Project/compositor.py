@@ -0,0 +1,158 @@
+"""CSC110 Fall 2020: Final Project (compositor.py)
+
+Compositing of frames on a background thread.
+
+The NumPy blending of a frame used to run on the Tkinter mainloop,
+so clicks and window dragging waited for every frame to be generated.
+A RenderWorker composites the next frame into a back buffer on its own
+thread (NumPy releases the GIL for the blending), while the Tkinter
+thread only turns the finished front buffer into a PhotoImage.
+"""
+
+from typing import Callable, List, Optional, Tuple
+import threading
+
+import numpy as np
+from PIL import Image
+
+from memory import FrameMemoryTracker
+
+
+class RenderWorker:
+    """A thread that composites frames with double buffering.
+
+    A compose function fills the float buffer it is given with an RGBA
+    frame; the worker converts it into one of two uint8 buffers. The
+    buffer last published is the front buffer, which present() shows,
+    and the other one is the back buffer, which the worker writes into.
+
+    Only the most recent compose function submitted is run, so the worker
+    never falls behind the Tkinter thread.
+
+    Instance variables:
+        - shape: the shape (height, width, 4) of every frame
+        - frames_composed: the number of frames composited so far
+        - tracker: records the memory allocated by each frame, once enabled
+    """
+    shape: Tuple[int, int, int]
+    frames_composed: int
+    tracker: FrameMemoryTracker
+    _work: np.ndarray
+    _buffers: List[np.ndarray]
+    _back: int
+    _ready: Optional[int]
+    _job: Optional[Callable[[np.ndarray], None]]
+    _error: Optional[BaseException]
+
+    def __init__(self, shape: Tuple[int, int, int],
+                 dtype: str = 'float64') -> None:
+        """Initializes the buffers; call start() to start the thread.
+
+        dtype is the precision frames are composited in.
+        """
+        self.shape = shape
+        self.frames_composed = 0
+        self.tracker = FrameMemoryTracker()
+
+        self._work = np.zeros(shape, dtype=dtype)
+        self._buffers = [np.zeros(shape, dtype='uint8'),
+                         np.zeros(shape, dtype='uint8')]
+        self._back = 0
+        self._ready = None
+
+        self._job = None
+        self._error = None
+        self._running = False
+
+        # _lock guards _job, _ready, _back and _error; _wake is set when
+        # a job is submitted, _done when a frame is published
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='RenderWorker')
+
+    def start(self) -> None:
+        """Starts the worker thread, if it is not running yet."""
+        if not self._running:
+            self._running = True
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the worker thread after the frame it is compositing."""
+        self._running = False
+        self._wake.set()
+
+    def submit(self, compose: Callable[[np.ndarray], None]) -> None:
+        """Asks the worker to composite a frame with compose, replacing
+        any frame that was submitted but not started yet."""
+        with self._lock:
+            self._job = compose
+        self._wake.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until a frame is ready to be presented.
+
+        Returns False if timeout seconds passed first.
+        """
+        return self._done.wait(timeout)
+
+    def present(self, show: Callable[[Image.Image], None]) -> bool:
+        """Calls show with the newest finished frame, if there is one
+        that has not been presented yet, and returns whether it did.
+
+        Must be called from the Tkinter thread. show must copy the image
+        (as ImageTk.PhotoImage does) since the buffer is reused.
+        """
+        with self._lock:
+            if self._error is not None:
+                error, self._error = self._error, None
+                self._done.clear()
+                raise error
+
+            if self._ready is None:
+                return False
+
+            # The worker cannot publish into this buffer while the
+            # lock is held, so show sees a complete frame
+            show(Image.fromarray(self._buffers[self._ready]))
+            self._ready = None
+            self._done.clear()
+            return True
+
+    def _run(self) -> None:
+        """Composites the submitted frames until stop() is called."""
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if not self._running:
+                return
+
+            with self._lock:
+                job, self._job = self._job, None
+                back = self._back
+            if job is None:
+                continue
+
+            try:
+                self.tracker.begin_frame()
+                job(self._work)
+                with self.tracker.stage('clip'):
+                    np.clip(self._work, 0, 255, out=self._work)
+                with self.tracker.stage('convert'):
+                    np.copyto(self._buffers[back], self._work, casting='unsafe')
+                self.tracker.end_frame()
+            except Exception as error:
+                with self._lock:
+                    self._error = error
+                    self._done.set()
+                continue
+
+            # Swap the buffers: the new frame becomes the front buffer.
+            # _done is set under the lock so that present() cannot clear
+            # it in between and leave it set with no frame ready
+            with self._lock:
+                self._ready = back
+                self._back = 1 - back
+                self.frames_composed += 1
+                self._done.set()
@@ -7,26 +7,40 @@ In PyCharm, go to File -> Settings -> Setting for the main folder (e.g. Project:
 Python Interpreter -> Click on '+' symbol -> search "beautifulsoup4" -> Install Package
 
 Mark the "Project" folder as source root.
+
+requests, beautifulsoup4 and multiprocessing are only imported when the
+data is actually downloaded or read, so that importing this module
+does not slow down the start of the program.
 """
 
-import requests
-from bs4 import BeautifulSoup
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Iterator, Optional, Union, TYPE_CHECKING
+from abc import ABC, abstractmethod
+import codecs
 import csv
 import json
 
-import multiprocessing as mp
+import numpy as np
+
+if TYPE_CHECKING:
+    import multiprocessing as mp
 
 import time
 
-# Both of these global variables represent the link to the USA Donation Dataset
+# Both of these global variables represent the link to the USA Donation Dataset;
+# URL is formatted with the industry code, e.g. 'E01' for oil and gas
 BASE = "https://www.opensecrets.org/industries/recips.php"
-URL = "?ind=E01&recipdetail=A&sortorder=U&mem=Y&cycle="
+URL = "?ind={}&recipdetail=A&sortorder=U&mem=Y&cycle="
+
+# Industry code of oil and gas in the USA Donation Dataset
+OIL_AND_GAS = 'E01'
+
+# Election cycles with both donations and emissions in the USA datasets
+USA_CYCLES = list(range(2008, 2020, 2))
 
 
-def get_donation_data_usa(year: int) -> Tuple[int, int]:
+def get_donation_data_usa(year: int, industry: str = OIL_AND_GAS) -> Tuple[int, int]:
     """Returns the dict value
-    representing (Year, Donation amount).
+    representing (Year, Donation amount) of the given industry.
 
     Available datasets:
         - Donations between 1990 to 2020, every second year
@@ -35,10 +49,12 @@ def get_donation_data_usa(year: int) -> Tuple[int, int]:
     To avoid accessing the wrong value:
 
     Preconditions:
-        - year in {2008, 2010, 2012, 2014, 2016, 2018}
+        - year in range(1990, 2022, 2)
     """
+    import requests
+    from bs4 import BeautifulSoup
 
-    raw_html = requests.get(BASE + URL + str(year)).text
+    raw_html = requests.get(BASE + URL.format(industry) + str(year)).text
     data = BeautifulSoup(raw_html, features='html.parser')
 
     table = data.find_all("table")[0]
@@ -90,12 +106,128 @@ def read_ghg_data_usa(filepath: str, year: int) -> Tuple[int, int]:
     return (year, int(processed_value))
 
 
-# 5 possible filepaths:
-# 'csv/donations_1993_to_2003.csv'
-# 'csv/donations_2004_to_2009.csv'
-# 'csv/donations_2010_to_2012.csv'
-# 'csv/donations_2013_to_2015.csv'
-# 'csv/donations_2016_to_2018.csv'
+# The 5 Canada donation datasets
+CANADA_DONATION_FILES = ['csv/donations_1993_to_2003.csv',
+                         'csv/donations_2004_to_2009.csv',
+                         'csv/donations_2010_to_2012.csv',
+                         'csv/donations_2013_to_2015.csv',
+                         'csv/donations_2016_to_2018.csv']
+
+# Name prefixes of the 10 main oil and gas companies in Canada;
+# note that some words have been omitted to increase accuracy of filtering
+# and to avoid filtering wrong companies
+MAIN_OIL_COMPANIES = ('Suncor', 'Canadian Natural', 'Imperial Oil',
+                      'Enbridge', 'Transcanada', 'Husky', 'Cenovus',
+                      'Encana', 'Talisman', 'Crescent Point')
+
+
+# The same prefixes, for filtering the raw bytes of a csv field
+# (every supported encoding is ASCII compatible)
+MAIN_OIL_COMPANIES_BYTES = tuple(c.encode('ascii') for c in MAIN_OIL_COMPANIES)
+
+
+def is_fossil_fuel_contributor(name: Union[str, bytes]) -> bool:
+    """Return whether the contributor name belongs to one of the
+    main oil companies or to a fuel company.
+
+    name may be either decoded or the raw bytes of a csv field.
+    """
+    if isinstance(name, bytes):
+        return name.startswith(MAIN_OIL_COMPANIES_BYTES) or b"Fuel" in name
+    return name.startswith(MAIN_OIL_COMPANIES) or "Fuel" in name
+
+
+# Number of bytes looked at to detect the encoding of a csv file
+ENCODING_SAMPLE_SIZE = 1 << 16
+
+
+def detect_encoding(filepath: str) -> str:
+    """Return the encoding of the file at filepath.
+
+    The csv files are exported either as UTF-8 (with or without a BOM)
+    or with a Windows code page, so only the first ENCODING_SAMPLE_SIZE
+    bytes are looked at:
+        - a UTF-8 BOM gives 'utf-8-sig'
+        - non-ASCII bytes that are valid UTF-8 give 'utf-8'
+        - otherwise 'cp1252', or 'latin-1' if the bytes are not valid cp1252
+    """
+    with open(filepath, 'rb') as file:
+        sample = file.read(ENCODING_SAMPLE_SIZE)
+
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+
+    # Ignore a last line that may have been cut in the middle of a character
+    if len(sample) == ENCODING_SAMPLE_SIZE and b'\n' in sample:
+        sample = sample[:sample.rindex(b'\n')]
+
+    if not sample.isascii():
+        try:
+            sample.decode('utf-8')
+            return 'utf-8'
+        except UnicodeDecodeError:
+            pass
+
+    try:
+        sample.decode('cp1252')
+        return 'cp1252'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def decode_field(field: bytes, encoding: str) -> str:
+    """Return field decoded with encoding, falling back to latin-1
+    (which accepts any byte) if a later part of the file does not
+    match the detected encoding."""
+    try:
+        return field.decode(encoding)
+    except UnicodeDecodeError:
+        return field.decode('latin-1')
+
+
+def _split_quoted(record: bytes) -> List[bytes]:
+    """Return the fields of a csv record that contains quotes."""
+    # latin-1 maps every byte to exactly one character, so the round trip
+    # gives back the original bytes whatever the encoding of the file is
+    row = next(csv.reader([record.decode('latin-1')]))
+    return [field.encode('latin-1') for field in row]
+
+
+def iter_csv_rows(filepath: str) -> Iterator[List[bytes]]:
+    """Yield each row of the csv file at filepath, header included,
+    as a list of undecoded fields.
+
+    Records without quotes are split directly on commas; only records
+    with quoted fields go through the csv module. Use decode_field with
+    the result of detect_encoding to decode the fields that are needed.
+    """
+    with open(filepath, 'rb') as file:
+        first = True
+        pending = b''
+        for line in file:
+            if first:
+                first = False
+                if line.startswith(codecs.BOM_UTF8):
+                    line = line[len(codecs.BOM_UTF8):]
+
+            if pending != b'':
+                line = pending + line
+                pending = b''
+
+            if line.strip() == b'':
+                continue
+            elif b'"' not in line:
+                yield line.rstrip(b'\r\n').split(b',')
+            elif line.count(b'"') % 2 == 1:
+                # A quoted field continues on the next line
+                pending = line
+            else:
+                yield _split_quoted(line.rstrip(b'\r\n'))
+
+        if pending != b'':
+            yield _split_quoted(pending.rstrip(b'\r\n'))
+
+
 def read_donation_data_canada(filepath: str) -> Dict[int, float]:
     """Return a dict with {Year: Amount of donation}.
 
@@ -125,25 +257,19 @@ def read_donation_data_canada(filepath: str) -> Dict[int, float]:
     """
     processed_totals = {}
 
-    with open(filepath, encoding='ansi') as file:
-        reader = csv.reader(file)
-        # Skip header row
-        next(reader)
-
-        # note that some words have been omitted to increase accuracy of filtering
-        # and to avoid filtering wrong companies
-        main_oil_companies = ('Suncor', 'Canadian Natural', 'Imperial Oil',
-                              'Enbridge', 'Transcanada', 'Husky', 'Cenovus',
-                              'Encana', 'Talisman', 'Crescent Point')
-
-        for row in reader:
-            if row[3] == 'Corporations' and \
-                    row[0] != 'N/A' and \
-                    (row[4].startswith(main_oil_companies) or "Fuel" in row[4]):
-                try:
-                    processed_totals[int(row[0])] += float(row[-1])
-                except KeyError:
-                    processed_totals[int(row[0])] = float(row[-1])
+    reader = iter_csv_rows(filepath)
+    # Skip header row
+    next(reader)
+
+    # The filter only looks at the raw bytes, so no field has to be decoded
+    for row in reader:
+        if row[3] == b'Corporations' and \
+                row[0] != b'N/A' and \
+                is_fossil_fuel_contributor(row[4]):
+            try:
+                processed_totals[int(row[0])] += float(row[-1])
+            except KeyError:
+                processed_totals[int(row[0])] = float(row[-1])
 
     return processed_totals
 
@@ -162,140 +288,241 @@ def read_ghg_data_canada(year: int) -> Tuple[int, int]:
     Preconditions:
         - 1993 <= year <= 2017
     """
-    with open('csv/ghg_emissions_national_en.csv', encoding='ansi') as file:
-        reader = csv.reader(file)
-        # Skip header row
-        next(reader)
+    reader = iter_csv_rows('csv/ghg_emissions_national_en.csv')
+    # Skip header row
+    next(reader)
 
-        processed_total = 0
+    processed_total = 0
 
-        # row is a list of strings
-        for row in reader:
-            if int(row[0]) == year:
-                processed_total += float(row[-1])
+    # row is a list of bytes
+    for row in reader:
+        if int(row[0]) == year:
+            processed_total += float(row[-1])
 
     return (year, int(processed_total))
 
 
-class UsaData:
-    """A class representing data from USA.
+class Dataset:
+    """A compact, year-sorted dataset for one country.
 
     Instance variables:
-        - data: a dictionary mapping from the year value to another dictionary
-        containing the amount of donations received and the amount of
-        emissions in each year, in USA
+        - country: the key of the provider this dataset was loaded from
+        - currency: the currency the donations are reported in
+        - years: the years covered by the dataset, in increasing order
+        - donations: the amount of donations received in each year
+        - emissions: the amount of emissions in each year
+
+    The three columns are read-only NumPy arrays of the same length,
+    so they can be handed directly to a renderer without copying.
+
+    Representation Invariants:
+        - len(self.years) == len(self.donations) == len(self.emissions)
+        - all(self.years[i] < self.years[i + 1] for i in range(len(self.years) - 1))
     """
-    data: Dict[int, Dict[str, int]]
+    __slots__ = ('country', 'currency', 'years', 'donations', 'emissions')
+    country: str
+    currency: str
+    years: np.ndarray
+    donations: np.ndarray
+    emissions: np.ndarray
 
-    def __init__(self) -> None:
-        """Initializes the instance variable data."""
-        self.data = {}
-        for year in range(2008, 2020, 2):
-            temp_dict = {'Donation': 0, 'Emission': 0}
-            donation_amount = get_donation_data_usa(year)[1]
-            ghg_amount = read_ghg_data_usa('json/dataset_ghg_usa.json', year)[1]
-            temp_dict['Donation'] = donation_amount
-            temp_dict['Emission'] = ghg_amount
-            self.data[year] = temp_dict
+    def __init__(self, country: str, currency: str,
+                 rows: Dict[int, Tuple[int, int]]) -> None:
+        """Initializes the dataset from a dict of {Year: (Donation, Emission)}."""
+        self.country = country
+        self.currency = currency
 
-    def get_donation(self) -> List[int]:
-        """Returns a list containing donation data from USA."""
-        donation_list = []
-        for year in self.data:
-            donation_list.append(self.data[year]['Donation'])
+        ordered = sorted(rows.items())
+        self.years = np.array([year for year, _ in ordered], dtype=np.int64)
+        self.donations = np.array([value[0] for _, value in ordered], dtype=np.int64)
+        self.emissions = np.array([value[1] for _, value in ordered], dtype=np.int64)
 
-        return donation_list
+        for column in (self.years, self.donations, self.emissions):
+            column.flags.writeable = False
 
-    def get_emission(self) -> List[int]:
-        """Returns a list containing emission data from USA."""
-        emission_list = []
-        for year in self.data:
-            emission_list.append(self.data[year]['Emission'])
+    def __len__(self) -> int:
+        """Returns the number of years in the dataset."""
+        return len(self.years)
 
-        return emission_list
+    def get_donation(self) -> np.ndarray:
+        """Returns a read-only view of the donation column."""
+        return self.donations
 
-    def get_year(self) -> List[int]:
-        """Returns a list containing years from USA datasets."""
-        return [year for year in self.data]
+    def get_emission(self) -> np.ndarray:
+        """Returns a read-only view of the emission column."""
+        return self.emissions
 
+    def get_year(self) -> np.ndarray:
+        """Returns a read-only view of the year column."""
+        return self.years
 
-def multi_read_donation(f: str, q: mp.Queue) -> None:
-    """Worker process that reads canada donation data"""
-    q.put(read_donation_data_canada(f))
+    def as_dict(self) -> Dict[int, Dict[str, int]]:
+        """Returns the dataset as {Year: {'Donation': ..., 'Emission': ...}}."""
+        return {int(self.years[i]): {'Donation': int(self.donations[i]),
+                                     'Emission': int(self.emissions[i])}
+                for i in range(len(self.years))}
+
+
+class DataProvider(ABC):
+    """An abstract source of yearly donation and emission data for one country.
 
+    Instance variables:
+        - country: a short key identifying the country, e.g. 'U' or 'C'
+        - currency: the currency the donations are reported in
+
+    Subclasses only need to implement read(); load() turns its
+    result into a Dataset.
+    """
+    country: str
+    currency: str
+
+    @abstractmethod
+    def read(self) -> Dict[int, Tuple[int, int]]:
+        """Returns a dict of {Year: (Donation, Emission)}."""
+
+    def load(self) -> Dataset:
+        """Returns the data of this provider as a Dataset."""
+        return Dataset(self.country, self.currency, self.read())
+
+
+class UsaProvider(DataProvider):
+    """Provides the donation and emission data from USA.
 
-class CanadaData:
-    """A class representing data from Canada.
+    The key of the provider is 'U' for oil and gas, and 'U-' followed by
+    the industry code for any other industry, e.g. 'U-E08'.
 
     Instance variables:
-        - data: a dictionary mapping from the year value to another dictionary
-        containing the amount of donations received and the amount of
-        emissions in each year, in Canada
+        - industry: the industry code the donations are from
+        - cycles: the election cycles to read
+        - store_path: the file the scraped donations are saved to and
+          resumed from (see scrape.py), or None to keep them in memory
 
-    Note: it may take a few seconds to process data
-    and initialize the instance variable data, since
+    Representation Invariants:
+        - all(cycle in USA_CYCLES for cycle in self.cycles)
+    """
+    industry: str
+    cycles: List[int]
+    store_path: Optional[str]
+
+    def __init__(self, industry: str = OIL_AND_GAS,
+                 cycles: Optional[List[int]] = None,
+                 store_path: Optional[str] = None) -> None:
+        """Initializes the provider.
+
+        Raises ValueError if a cycle has no emission data (see USA_CYCLES);
+        use scrape.py directly to scrape the donations of other cycles.
+        """
+        if cycles is None:
+            cycles = USA_CYCLES
+        without_emissions = [cycle for cycle in cycles if cycle not in USA_CYCLES]
+        if without_emissions != []:
+            raise ValueError('No USA emission data for cycles {}; available '
+                             'cycles are {}'.format(without_emissions, USA_CYCLES))
+
+        self.country = 'U' if industry == OIL_AND_GAS else 'U-' + industry
+        self.currency = 'USD'
+        self.industry = industry
+        self.cycles = cycles
+        self.store_path = store_path
+
+    def read(self) -> Dict[int, Tuple[int, int]]:
+        """Returns a dict of {Year: (Donation, Emission)} for USA."""
+        import scrape
+
+        # The cycles are downloaded in parallel
+        store = scrape.ScrapeStore(self.store_path)
+        errors = scrape.scrape([self.industry], self.cycles, store)
+        if errors != {}:
+            raise next(iter(errors.values()))
+
+        rows = {}
+        for year in self.cycles:
+            donation_amount = store.get(self.industry, year)
+            ghg_amount = read_ghg_data_usa('json/dataset_ghg_usa.json', year)[1]
+            rows[year] = (donation_amount, ghg_amount)
+
+        return rows
+
+
+def multi_read_donation(f: str, q: 'mp.Queue') -> None:
+    """Worker process that reads canada donation data"""
+    q.put(read_donation_data_canada(f))
+
+
+class CanadaProvider(DataProvider):
+    """Provides the donation and emission data from Canada.
+
+    Note: it may take a few seconds to read the data, since
     the given 5 donation datasets are quite large.
     """
-    data: Dict[int, Dict[str, int]]
 
     def __init__(self) -> None:
-        """Initializes the instance variable data."""
-        self.data = {}
+        """Initializes the provider."""
+        self.country = 'C'
+        self.currency = 'CAD'
+
+    def read(self) -> Dict[int, Tuple[int, int]]:
+        """Returns a dict of {Year: (Donation, Emission)} for Canada."""
+        import multiprocessing as mp
 
-        filepaths = ['csv/donations_1993_to_2003.csv',
-                     'csv/donations_2004_to_2009.csv',
-                     'csv/donations_2010_to_2012.csv',
-                     'csv/donations_2013_to_2015.csv',
-                     'csv/donations_2016_to_2018.csv']
+        filepaths = CANADA_DONATION_FILES
 
         q = mp.Queue()
         processes = set()
-        
+
         for f in filepaths:
             p = mp.Process(target=multi_read_donation,
-                           args=(f,q))
+                           args=(f, q))
             p.start()
             processes.add(p)
 
+        # Drain one result per worker before joining, so that no worker
+        # blocks forever on a full queue
+        donations = {}
+        for _ in filepaths:
+            donations.update(q.get())
+
         for p in processes:
             p.join()
 
-        while not q.empty():
-            temp_dict = q.get()
-            for year in temp_dict:
-                ghg_amount = read_ghg_data_canada(year)[1]
-                self.data[year] = {'Donation': int(temp_dict[year]),
-                                   'Emission': ghg_amount}
+        rows = {}
+        for year in donations:
+            ghg_amount = read_ghg_data_canada(year)[1]
+            rows[year] = (int(donations[year]), ghg_amount)
+
+        return rows
 
-    def get_donation(self) -> List[int]:
-        """Returns a list containing donation data from Canada."""
-        donation_list = []
-        for year in self.data:
-            donation_list.append(self.data[year]['Donation'])
 
-        return donation_list
+# Every country that can be loaded, keyed by DataProvider.country
+PROVIDERS: Dict[str, DataProvider] = {}
 
-    def get_emission(self) -> List[int]:
-        """Returns a list containing emission data from Canada."""
-        emission_list = []
-        for year in self.data:
-            emission_list.append(self.data[year]['Emission'])
 
-        return emission_list
+def register_provider(provider: DataProvider) -> None:
+    """Makes provider available to load_dataset under provider.country."""
+    PROVIDERS[provider.country] = provider
+
+
+def load_dataset(country: str) -> Dataset:
+    """Returns the Dataset of the provider registered under country.
+
+    Preconditions:
+        - country in PROVIDERS
+    """
+    return PROVIDERS[country].load()
+
 
-    def get_year(self) -> List[int]:
-        """Returns a list containing years from USA datasets."""
-        return [year for year in self.data]
+register_provider(UsaProvider())
+register_provider(CanadaProvider())
 
 
 if __name__ == "__main__":
     start = time.perf_counter()
-    usa_data = UsaData()
-    canada_data = CanadaData()
+    usa_data = load_dataset('U')
+    canada_data = load_dataset('C')
     print('Time taken', time.perf_counter() - start)
     print()
-    print('Data from USA: ', usa_data.data)
-    print('Data from Canada: ', canada_data.data)
+    print('Data from USA: ', usa_data.as_dict())
+    print('Data from Canada: ', canada_data.as_dict())
 
     # It might take a while to run, but at the end
     # two processed datasets will be printed out; one from USA
@@ -1,7 +1,42 @@
 # Main
+#
+# Options:
+#   --startup-time       print the time taken to render the first
+#                        menu frame and exit (used by startup.py),
+#                        with status 1 if no frame was shown
+#   --track-memory       print the memory allocated by each render
+#                        stage on exit (see memory.py)
+#   --memory-budget=MB   keep the memory used to composite a frame
+#                        under MB megabytes
+
+import time
+launched = time.perf_counter()
+
+import sys
 
 if __name__ == "__main__":
+    budget = None
+    for arg in sys.argv[1:]:
+        if arg.startswith('--memory-budget='):
+            budget = int(float(arg.split('=')[1]) * 1e6)
+
     from Visualizer import Project
-    p = Project()
-    p.start()
-    p.mainloop()
+    p = Project(memory_budget=budget)
+    if '--track-memory' in sys.argv:
+        p.worker.tracker.enable()
+    shown = p.start()
+
+    if '--startup-time' in sys.argv:
+        if not shown:
+            print("No frame was shown", file=sys.stderr)
+            p.root.destroy()
+            sys.exit(1)
+        # Flush the first frame to the screen before stopping the clock
+        p.update()
+        print("First frame in", time.perf_counter() - launched, flush=True)
+        p.root.destroy()
+    else:
+        p.mainloop()
+
+    if '--track-memory' in sys.argv:
+        print(p.worker.tracker.report())
@@ -0,0 +1,165 @@
+"""CSC110 Fall 2020: Final Project (memory.py)
+
+Memory used by the renderer.
+
+A FrameMemoryTracker uses tracemalloc to attribute the bytes allocated
+while compositing a frame to each render stage (background, title,
+buttons, ...). choose_dtype picks the precision of the frame buffers
+so that the peak memory of a frame stays under a budget, for running
+on machines with little memory.
+"""
+
+from typing import Dict, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+import tracemalloc
+
+import numpy as np
+
+# Buffer precisions of the renderer, from most to least precise
+DTYPES = ('float64', 'float32', 'float16')
+
+# Number of temporaries of the size of the largest blended image a blend makes
+BLEND_TEMPORARIES = 2
+
+# Number of uint8 frame-sized buffers the renderer keeps: the front and
+# back buffers of the RenderWorker, and the canvas the graph lines are drawn on
+UINT8_BUFFERS = 3
+
+
+class FrameMemoryTracker:
+    """Records the bytes allocated in each render stage of a frame.
+
+    While enabled, each stage of a frame records the peak traced memory
+    reached during the stage, above the traced memory when it began.
+    Before Python 3.9 the peak can only be reset by clearing every trace,
+    so memory kept alive from one stage into the next is not counted in
+    the peak of the frame there.
+
+    tracemalloc traces the whole process, so allocations made by other
+    threads while a stage runs are attributed to that stage too.
+
+    Instance variables:
+        - enabled: whether frames are being tracked
+        - stages: the bytes allocated in each stage of the last frame
+        - peak: the peak bytes allocated during the last frame
+        - history: the stages of every tracked frame, oldest first
+    """
+    enabled: bool
+    stages: Dict[str, int]
+    peak: int
+    history: List[Dict[str, int]]
+
+    def __init__(self) -> None:
+        """Initializes a disabled tracker."""
+        self.enabled = False
+        self.stages = {}
+        self.peak = 0
+        self.history = []
+        self._frame_start = 0
+        self._started_tracing = False
+
+    def enable(self) -> None:
+        """Starts tracing allocations."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stops tracing allocations, if enable() started it."""
+        self.enabled = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _reset_peak(self) -> None:
+        """Resets the peak traced memory."""
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        else:
+            # Forgetting every trace sets both the traced memory and its
+            # peak back to 0, so only new allocations are counted
+            tracemalloc.clear_traces()
+
+    def begin_frame(self) -> None:
+        """Starts recording a new frame."""
+        if self.enabled:
+            self.stages = {}
+            self.peak = 0
+            self._reset_peak()
+            self._frame_start = tracemalloc.get_traced_memory()[0]
+
+    def end_frame(self) -> None:
+        """Finishes recording the current frame."""
+        if self.enabled:
+            self.history.append(self.stages)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Attributes the memory allocated inside the with block to stage name."""
+        if not self.enabled:
+            yield
+            return
+
+        self._reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.stages[name] = self.stages.get(name, 0) + max(peak - before, 0)
+            self.peak = max(self.peak, peak - self._frame_start)
+
+    def report(self) -> str:
+        """Returns the average bytes allocated per frame in each stage."""
+        if self.history == []:
+            return 'No frames tracked'
+
+        totals = {}
+        for frame in self.history:
+            for name in frame:
+                totals[name] = totals.get(name, 0) + frame[name]
+
+        lines = ['Average allocations over {} frames:'.format(len(self.history))]
+        for name in totals:
+            lines.append('  {:<12}{:>12,} bytes'.format(
+                name, totals[name] // len(self.history)))
+        lines.append('  {:<12}{:>12,} bytes'.format('last peak', self.peak))
+        return '\n'.join(lines)
+
+
+def frame_bytes(shape: Tuple[int, int, int], resident: int,
+                largest_source: int, dtype: str) -> int:
+    """Return an estimate of the peak bytes the renderer needs to composite
+    one frame.
+
+    shape is the shape of the frame, resident the number of values in the
+    asset arrays kept in dtype (images and lit/dimmed buttons), and
+    largest_source the number of values in the largest image blended onto
+    a frame. This counts the work buffer, the resident assets, the
+    temporaries of a blend and the UINT8_BUFFERS uint8 buffers.
+    """
+    values = shape[0] * shape[1] * shape[2]
+    itemsize = np.dtype(dtype).itemsize
+    return (values + resident + BLEND_TEMPORARIES * largest_source) * itemsize \
+        + UINT8_BUFFERS * values
+
+
+def choose_dtype(shape: Tuple[int, int, int], resident: int,
+                 largest_source: int, budget: Optional[int]) -> str:
+    """Return the most precise dtype in DTYPES whose frames fit in budget bytes
+    (see frame_bytes), or 'float64' if budget is None.
+
+    Raises ValueError if no dtype fits.
+    """
+    if budget is None:
+        return DTYPES[0]
+
+    for dtype in DTYPES:
+        if frame_bytes(shape, resident, largest_source, dtype) <= budget:
+            return dtype
+
+    raise ValueError('A frame needs at least {} bytes, over the budget of {}'
+                     .format(frame_bytes(shape, resident, largest_source,
+                                         DTYPES[-1]),
+                             budget))
@@ -0,0 +1,353 @@
+"""CSC110 Fall 2020: Final Project (query.py)
+
+Indexed queries over the individual contributions in the Canada
+donation datasets. read_donation_data_canada in data.py only keeps
+one yearly total; the DonationIndex below keeps every row so that
+questions like "Suncor only", "top 20 fossil fuel contributors in 2011"
+or "all contributors matching Enbridge" can be answered without
+rescanning the csv files.
+
+Example:
+    index = build_index()
+    index.totals_by_year('Suncor')
+    index.top_contributors(20, year=2011, fossil_only=True)
+    index.contributors('Enbridge')
+"""
+
+import data
+
+from typing import Dict, List, Optional, Set, Tuple
+import bisect
+import re
+import unicodedata
+
+import numpy as np
+
+# Columns of the Canada donation datasets
+YEAR_COLUMN = 0
+RECIPIENT_COLUMN = 1
+TYPE_COLUMN = 3
+NAME_COLUMN = 4
+AMOUNT_COLUMN = -1
+
+# Words that do not tell contributors apart, e.g. "Suncor Energy Inc."
+# and "Suncor Energy Inc" are the same contributor
+IGNORED_WORDS = {'the', 'inc', 'incorporated', 'ltd', 'ltee', 'limited',
+                 'corp', 'corporation', 'co', 'company', 'llc', 'lp', 'ulc'}
+
+# Words shorter than this are not matched to misspelled words
+MIN_TYPO_LENGTH = 5
+
+
+def normalize_name(name: str) -> Tuple[str, ...]:
+    """Return the words of a contributor name, lower case and without
+    accents, punctuation or words from IGNORED_WORDS.
+
+    >>> normalize_name('Suncor Energy Inc.')
+    ('suncor', 'energy')
+    >>> normalize_name('Hydro-Québec')
+    ('hydro', 'quebec')
+    """
+    # Split accented letters into a base letter and a combining mark,
+    # and drop the marks, so that 'Québec' and 'Quebec' are the same word
+    decomposed = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    words = re.split(r'[^0-9a-z]+', name.lower())
+    return tuple(w for w in words if w != '' and w not in IGNORED_WORDS)
+
+
+def _deletions(word: str) -> Set[str]:
+    """Return every string obtained by deleting one character from word."""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class DonationIndex:
+    """An in-memory index over every contribution in the Canada donation datasets.
+
+    Contributors whose names normalize to the same words are merged into
+    one contributor. Rows are stored as NumPy columns sorted by contributor,
+    so that all rows of a contributor are one contiguous slice.
+
+    Instance variables:
+        - names: the first spelling seen of each contributor's name
+        - kinds: the contributor type of each contributor, e.g. 'Corporations'
+        - fossil: whether any spelling of each contributor's name is one
+          of the fossil fuel contributors read_donation_data_canada counts
+        - recipients: the name of each recipient
+        - years: every year in the datasets, in increasing order
+        - row_year, row_recipient, row_amount: one entry per row
+        - offsets: the rows of contributor i are offsets[i]:offsets[i + 1]
+        - words: maps a normalized word to the contributors whose name contains it
+        - vocabulary: every key of words, sorted
+
+    Representation Invariants:
+        - len(self.names) == len(self.kinds) == len(self.fossil)
+        - len(self.offsets) == len(self.names) + 1
+    """
+    names: List[str]
+    kinds: List[str]
+    fossil: np.ndarray
+    recipients: List[str]
+    years: np.ndarray
+    row_year: np.ndarray
+    row_recipient: np.ndarray
+    row_amount: np.ndarray
+    offsets: np.ndarray
+    words: Dict[str, Set[int]]
+    vocabulary: List[str]
+    _by_year: Dict[Optional[int], np.ndarray]
+    _neighbours: Optional[Dict[str, Set[str]]]
+
+    def __init__(self) -> None:
+        """Initializes an empty index."""
+        self.names = []
+        self.kinds = []
+        self._fossil = []
+        self.recipients = []
+        self.words = {}
+        self._keys = {}
+        self._recipient_ids = {}
+        self._rows = ([], [], [], [])
+        self._by_year = {}
+        self._neighbours = None
+
+    def add(self, year: int, recipient: str, kind: str,
+            name: str, amount: float) -> None:
+        """Add one contribution to the index.
+
+        Preconditions:
+            - self.freeze() has not been called yet
+        """
+        key = (kind, normalize_name(name))
+        if key not in self._keys:
+            self._keys[key] = len(self.names)
+            for word in key[1]:
+                self.words.setdefault(word, set()).add(len(self.names))
+            self.names.append(name)
+            self.kinds.append(kind)
+            self._fossil.append(False)
+
+        # Spellings that normalize to the same words may differ in case,
+        # which is_fossil_fuel_contributor does not ignore
+        if kind == 'Corporations' and data.is_fossil_fuel_contributor(name):
+            self._fossil[self._keys[key]] = True
+
+        if recipient not in self._recipient_ids:
+            self._recipient_ids[recipient] = len(self.recipients)
+            self.recipients.append(recipient)
+
+        years, contributors, recipients, amounts = self._rows
+        years.append(year)
+        contributors.append(self._keys[key])
+        recipients.append(self._recipient_ids[recipient])
+        amounts.append(amount)
+
+    def add_file(self, filepath: str) -> None:
+        """Add every contribution of a Canada donation dataset to the index."""
+        encoding = data.detect_encoding(filepath)
+        reader = data.iter_csv_rows(filepath)
+        # Skip header row
+        next(reader)
+
+        for row in reader:
+            if row[YEAR_COLUMN] == b'N/A':
+                continue
+            self.add(int(row[YEAR_COLUMN]),
+                     data.decode_field(row[RECIPIENT_COLUMN], encoding),
+                     data.decode_field(row[TYPE_COLUMN], encoding),
+                     data.decode_field(row[NAME_COLUMN], encoding),
+                     float(row[AMOUNT_COLUMN]))
+
+    def freeze(self) -> None:
+        """Sort the rows by contributor and compute the aggregates.
+
+        Must be called once after every row has been added.
+        """
+        years, contributors, recipients, amounts = self._rows
+        contributors = np.array(contributors, dtype=np.int64)
+        order = np.argsort(contributors, kind='stable')
+
+        self.row_year = np.array(years, dtype=np.int64)[order]
+        self.row_recipient = np.array(recipients, dtype=np.int64)[order]
+        self.row_amount = np.array(amounts, dtype=np.float64)[order]
+        counts = np.bincount(contributors, minlength=len(self.names))
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+
+        self.years = np.unique(self.row_year)
+        self.fossil = np.array(self._fossil, dtype=bool)
+        self.vocabulary = sorted(self.words)
+
+        self._rows = ([], [], [], [])
+        self._keys = {}
+        self._fossil = []
+
+    def _row_contributors(self) -> np.ndarray:
+        """Return the contributor of each row."""
+        return np.repeat(np.arange(len(self.names)), np.diff(self.offsets))
+
+    def _similar_words(self, word: str) -> Set[str]:
+        """Return the words of the index at most one typo away from word."""
+        if self._neighbours is None:
+            # Each word is reachable from all of its one-character deletions
+            self._neighbours = {}
+            for w in self.vocabulary:
+                for variant in _deletions(w) | {w}:
+                    self._neighbours.setdefault(variant, set()).add(w)
+
+        similar = set()
+        for variant in _deletions(word) | {word}:
+            similar |= self._neighbours.get(variant, set())
+        return similar
+
+    def _matching_words(self, word: str) -> Set[str]:
+        """Return the words of the index that start with word, and the words
+        at most one typo away from it.
+
+        Short words are only matched by prefix, since almost every short
+        word is one typo away from many others.
+        """
+        matches = set()
+        i = bisect.bisect_left(self.vocabulary, word)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(word):
+            matches.add(self.vocabulary[i])
+            i += 1
+
+        if len(word) >= MIN_TYPO_LENGTH or matches == set():
+            matches |= self._similar_words(word)
+        return matches
+
+    def search(self, query: str) -> List[int]:
+        """Return the contributors whose name matches every word of query.
+
+        A word of query matches a word of a name if it is a prefix of it,
+        so 'Canadian Natural' matches 'Canadian Natural Resources Limited'.
+        Words are also matched to the words one typo away from them, so
+        'Canadian Natural' also matches 'Canadian Natual Resources Ltd'.
+        """
+        found = None
+        for word in normalize_name(query):
+            ids = set()
+            for match in self._matching_words(word):
+                ids |= self.words[match]
+            found = ids if found is None else found & ids
+
+        return sorted(found) if found is not None else []
+
+    def contributors(self, query: str) -> List[Tuple[str, float]]:
+        """Return (name, total amount donated) of every contributor matching
+        query, from largest to smallest amount."""
+        ids = self.search(query)
+        totals = [(self.names[i],
+                   float(self.row_amount[self.offsets[i]:self.offsets[i + 1]].sum()))
+                  for i in ids]
+        return sorted(totals, key=lambda t: t[1], reverse=True)
+
+    def _rows_of(self, ids: List[int]) -> np.ndarray:
+        """Return the rows of the given contributors."""
+        if ids == []:
+            return np.array([], dtype=np.int64)
+        return np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1])
+                               for i in ids])
+
+    def totals_by_year(self, query: Optional[str] = None) -> Dict[int, float]:
+        """Return {Year: Amount of donation} of the contributors matching query,
+        or of every contributor if query is None."""
+        if query is None:
+            rows = slice(None)
+        else:
+            rows = self._rows_of(self.search(query))
+
+        year_index = np.searchsorted(self.years, self.row_year[rows])
+        totals = np.bincount(year_index, weights=self.row_amount[rows],
+                             minlength=len(self.years))
+        return {int(self.years[i]): float(totals[i])
+                for i in range(len(self.years)) if totals[i] != 0}
+
+    def total(self, query: str, year: Optional[int] = None) -> float:
+        """Return the amount donated by the contributors matching query,
+        in the given year or over every year if year is None."""
+        rows = self._rows_of(self.search(query))
+        amounts = self.row_amount[rows]
+        if year is not None:
+            amounts = amounts[self.row_year[rows] == year]
+        return float(amounts.sum())
+
+    def totals_by_recipient(self, query: Optional[str] = None,
+                            year: Optional[int] = None) -> Dict[str, float]:
+        """Return {Recipient: Amount of donation} of the contributors matching
+        query (every contributor if None), in the given year (every year if None)."""
+        if query is None:
+            rows = np.arange(len(self.row_amount))
+        else:
+            rows = self._rows_of(self.search(query))
+        if year is not None:
+            rows = rows[self.row_year[rows] == year]
+
+        totals = np.bincount(self.row_recipient[rows],
+                             weights=self.row_amount[rows],
+                             minlength=len(self.recipients))
+        return {self.recipients[i]: float(totals[i])
+                for i in np.nonzero(totals)[0]}
+
+    def _totals_in_year(self, year: Optional[int]) -> np.ndarray:
+        """Return the amount donated by each contributor in the given year,
+        or over every year if year is None."""
+        if year not in self._by_year:
+            contributors = self._row_contributors()
+            weights = self.row_amount
+            if year is not None:
+                in_year = self.row_year == year
+                contributors = contributors[in_year]
+                weights = weights[in_year]
+            self._by_year[year] = np.bincount(contributors, weights=weights,
+                                             minlength=len(self.names))
+        return self._by_year[year]
+
+    def top_contributors(self, n: int, year: Optional[int] = None,
+                         fossil_only: bool = False) -> List[Tuple[str, float]]:
+        """Return (name, amount donated) of the n largest contributors
+        in the given year (every year if None), from largest to smallest.
+
+        If fossil_only is True, only the fossil fuel contributors used by
+        read_donation_data_canada are considered.
+
+        Preconditions:
+            - n >= 0
+        """
+        totals = self._totals_in_year(year)
+        if fossil_only:
+            totals = np.where(self.fossil, totals, 0)
+
+        candidates = np.nonzero(totals)[0]
+        if n < len(candidates):
+            candidates = candidates[np.argpartition(-totals[candidates], n)[:n]]
+        order = candidates[np.argsort(-totals[candidates], kind='stable')]
+        return [(self.names[i], float(totals[i])) for i in order]
+
+
+def build_index(filepaths: Optional[List[str]] = None) -> DonationIndex:
+    """Return a DonationIndex over the given Canada donation datasets,
+    or over all 5 of them if filepaths is None."""
+    if filepaths is None:
+        filepaths = data.CANADA_DONATION_FILES
+
+    index = DonationIndex()
+    for filepath in filepaths:
+        index.add_file(filepath)
+    index.freeze()
+    return index
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    donation_index = build_index()
+    print('Indexed', len(donation_index.row_amount), 'rows in',
+          time.perf_counter() - start)
+    print()
+    print('Suncor only: ', donation_index.totals_by_year('Suncor'))
+    print('Top 20 fossil fuel contributors in 2011: ',
+          donation_index.top_contributors(20, year=2011, fossil_only=True))
+    print('Contributors matching Enbridge: ',
+          donation_index.contributors('Enbridge'))
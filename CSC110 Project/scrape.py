@@ -0,0 +1,213 @@
+"""CSC110 Fall 2020: Final Project (scrape.py)
+
+Scraping many industries and election cycles of the USA Donation Dataset.
+
+get_donation_data_usa downloads one (industry, cycle) page at a time.
+scrape() downloads a whole matrix of industry codes and cycles with a
+bounded pool of worker threads, at most a given number of requests per
+second, and streams each total into a ScrapeStore as it arrives. A store
+backed by a file is appended to after every page, so an interrupted run
+resumes where it stopped instead of downloading everything again.
+
+Example (oil and gas against another industry code, over all 16 cycles):
+    python scrape.py --industries E01 E08 --store scrape.jsonl
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import data
+
+# Every election cycle in the USA Donation Dataset
+ALL_CYCLES = list(range(1990, 2022, 2))
+
+# Default size of the worker pool and request rate (requests per second)
+WORKERS = 4
+RATE = 2.0
+
+
+class RateLimiter:
+    """Spaces out calls to wait() shared between threads, so that
+    they happen at most rate times per second.
+
+    Instance variables:
+        - interval: the minimum number of seconds between two calls
+    """
+    interval: float
+
+    def __init__(self, rate: float) -> None:
+        """Initializes the limiter.
+
+        Preconditions:
+            - rate > 0
+        """
+        self.interval = 1 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Blocks until the next call is allowed."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+
+        if start > now:
+            time.sleep(start - now)
+
+
+class ScrapeStore:
+    """The donation totals scraped so far, by industry and cycle.
+
+    If path is not None, every total added is appended to that file
+    as one JSON object per line, and the totals already in the file
+    are loaded when the store is created.
+
+    Instance variables:
+        - path: the file backing the store, or None
+        - totals: maps (industry, cycle) to the total amount donated
+    """
+    path: Optional[str]
+    totals: Dict[Tuple[str, int], int]
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """Initializes the store, loading the totals saved in path."""
+        self.path = path
+        self.totals = {}
+
+        if path is not None and os.path.exists(path):
+            with open(path) as file:
+                for line in file:
+                    # Ignore a last line cut off by an interrupted run
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.totals[(entry['industry'], entry['cycle'])] = entry['total']
+
+    def add(self, industry: str, cycle: int, total: int) -> None:
+        """Add the total of industry in cycle, saving it if the store has a file."""
+        self.totals[(industry, cycle)] = total
+
+        if self.path is not None:
+            with open(self.path, 'a') as file:
+                file.write(json.dumps({'industry': industry, 'cycle': cycle,
+                                       'total': total}) + '\n')
+
+    def get(self, industry: str, cycle: int) -> int:
+        """Return the total of industry in cycle.
+
+        Preconditions:
+            - (industry, cycle) in self.totals
+        """
+        return self.totals[(industry, cycle)]
+
+    def missing(self, industries: List[str], cycles: List[int]) -> List[Tuple[str, int]]:
+        """Return the (industry, cycle) pairs that have not been scraped yet."""
+        return [(industry, cycle) for industry in industries for cycle in cycles
+                if (industry, cycle) not in self.totals]
+
+    def by_cycle(self, industry: str) -> Dict[int, int]:
+        """Return {Cycle: Total} of every cycle scraped for industry."""
+        return {cycle: self.totals[(ind, cycle)]
+                for ind, cycle in sorted(self.totals) if ind == industry}
+
+
+def scrape(industries: List[str], cycles: List[int], store: ScrapeStore,
+           workers: int = WORKERS, rate: float = RATE,
+           fetch: Callable[[int, str], Tuple[int, int]] = data.get_donation_data_usa,
+           on_total: Optional[Callable[[str, int, int], None]] = None
+           ) -> Dict[Tuple[str, int], Exception]:
+    """Scrape the total of every industry in every cycle into store.
+
+    Pairs already in store are skipped. Up to workers pages are downloaded
+    at once, at most rate per second. Each total is added to store (and
+    passed to on_total, if given) as soon as it arrives.
+
+    Return the exception raised for each pair that could not be scraped;
+    those pairs are tried again by the next call.
+
+    Preconditions:
+        - workers >= 1
+        - rate > 0
+    """
+    limiter = RateLimiter(rate)
+
+    def fetch_one(industry: str, cycle: int) -> int:
+        """Download the total of industry in cycle."""
+        limiter.wait()
+        return fetch(cycle, industry)[1]
+
+    errors = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch_one, industry, cycle): (industry, cycle)
+                   for industry, cycle in store.missing(industries, cycles)}
+
+        # Only this thread touches store, so it needs no lock
+        for future in as_completed(futures):
+            industry, cycle = futures[future]
+            try:
+                total = future.result()
+            except Exception as error:
+                errors[(industry, cycle)] = error
+                continue
+
+            store.add(industry, cycle, total)
+            if on_total is not None:
+                on_total(industry, cycle, total)
+
+    return errors
+
+
+def parse_cycles(text: str) -> List[int]:
+    """Return the cycles described by text, either one cycle ('2008')
+    or an inclusive range ('1990-2020').
+
+    >>> parse_cycles('2008-2014')
+    [2008, 2010, 2012, 2014]
+    """
+    if '-' not in text:
+        return [int(text)]
+    first, last = text.split('-')
+    return list(range(int(first), int(last) + 1, 2))
+
+
+def main(argv: List[str]) -> int:
+    """Run the scrape from the command line arguments argv."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--industries', nargs='+', default=[data.OIL_AND_GAS])
+    parser.add_argument('--cycles', type=parse_cycles,
+                        default=ALL_CYCLES,
+                        help="one cycle or a range such as '1990-2020'")
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--rate', type=float, default=RATE,
+                        help='maximum requests per second')
+    parser.add_argument('--store', default='scrape.jsonl',
+                        help='file the totals are saved to and resumed from')
+    args = parser.parse_args(argv)
+
+    store = ScrapeStore(args.store)
+    todo = len(store.missing(args.industries, args.cycles))
+    print('{} pages to scrape, {} already in {}'.format(
+        todo, len(args.industries) * len(args.cycles) - todo, args.store))
+
+    start = time.perf_counter()
+    errors = scrape(args.industries, args.cycles, store, args.workers, args.rate,
+                    on_total=lambda i, c, t: print(i, c, t))
+    print('Done in', time.perf_counter() - start)
+
+    for industry, cycle in errors:
+        print('Failed: {} {}: {}'.format(industry, cycle, errors[(industry, cycle)]),
+              file=sys.stderr)
+
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,111 @@
+"""CSC110 Fall 2020: Final Project (startup.py)
+
+Checks that main.py stays within its startup time budget.
+
+Only the menu is needed to show the first frame, so the modules in
+DEFERRED_MODULES must not be imported until a button is clicked.
+Run this file to measure the startup of main.py; it exits with
+status 1 if a budget is exceeded.
+"""
+
+from typing import Dict, List, Optional
+import os
+import subprocess
+import sys
+import time
+
+# Time from launching main.py to its first rendered menu frame, in seconds
+STARTUP_BUDGET = 1.5
+
+# Cumulative time to import Visualizer, in seconds (as reported by -X importtime)
+IMPORT_BUDGET = 0.5
+
+# Modules that are only needed after a button has been clicked
+DEFERRED_MODULES = ('plotly', 'requests', 'bs4', 'multiprocessing')
+
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_times(module: str) -> Dict[str, float]:
+    """Return {Module name: Cumulative import time in seconds} of every
+    module imported by a fresh interpreter running "import module"."""
+    result = subprocess.run([sys.executable, '-X', 'importtime',
+                             '-c', 'import ' + module],
+                            cwd=FOLDER, capture_output=True, text=True,
+                            check=True)
+
+    times = {}
+    # Each line looks like "import time:  self [us] | cumulative | name"
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if not fields[1].strip().isdigit():
+            # Header line
+            continue
+        times[fields[2].strip()] = int(fields[1]) / 1e6
+
+    return times
+
+
+def first_frame_time() -> Optional[float]:
+    """Return the time in seconds main.py takes to render its first frame,
+    from the moment it is launched, or None if it showed no frame.
+
+    The clock is started here rather than in main.py, so that starting
+    the interpreter counts toward the time.
+
+    Preconditions:
+        - a display is available
+    """
+    launched = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'main.py', '--startup-time'],
+                               cwd=FOLDER, stdout=subprocess.PIPE, text=True)
+
+    frame_time = None
+    for line in process.stdout:
+        if line.startswith('First frame in'):
+            frame_time = time.perf_counter() - launched
+    process.wait()
+
+    if process.returncode != 0:
+        return None
+    return frame_time
+
+
+def check_startup(measure_frame: bool = True) -> List[str]:
+    """Return a description of every way the startup of main.py
+    exceeds its budget.
+
+    If measure_frame is False, only the imports are checked, which does
+    not need a display.
+    """
+    problems = []
+
+    times = import_times('Visualizer')
+    for module in times:
+        if module.split('.')[0] in DEFERRED_MODULES:
+            problems.append('{} is imported on startup'.format(module))
+
+    if times['Visualizer'] > IMPORT_BUDGET:
+        problems.append('Importing Visualizer took {:.3f}s (budget {}s)'
+                        .format(times['Visualizer'], IMPORT_BUDGET))
+
+    if measure_frame:
+        frame_time = first_frame_time()
+        if frame_time is None:
+            problems.append('main.py did not show a first frame')
+        elif frame_time > STARTUP_BUDGET:
+            problems.append('First frame took {:.3f}s (budget {}s)'
+                            .format(frame_time, STARTUP_BUDGET))
+
+    return problems
+
+
+if __name__ == "__main__":
+    found = check_startup(measure_frame='--imports-only' not in sys.argv)
+    for problem in found:
+        print(problem)
+    if found == []:
+        print('Startup is within budget')
+    sys.exit(1 if found else 0)